@@ -38,10 +38,10 @@ with some additional constraints for water, salt, and basement.
 
 """
 import emg3d
-import joblib
 import zipfile
 import pyvista
 import numpy as np
+from scipy import sparse
 import matplotlib.pyplot as plt
 from matplotlib.colors import LogNorm
 plt.style.use('ggplot')
@@ -52,11 +52,17 @@ plt.style.use('ggplot')
 # Velocity-to-resistivity transform
 # ---------------------------------
 #
-# The following cell loads the resistivity model ``res-model.lzma`` (~14 MB),
+# The following cell loads the resistivity model ``res-model.npy`` (~384 MB),
 # if it already exists in ``../data/SEG/``, or alternatively loads the velocity
 # model ``Saltf@@``, carries out the velocity-to-resistivity transform, and
 # stores the resistivity model.
 #
+# The resistivity model is stored as uncompressed binary file, which is loaded
+# as memory map. The model is therefore not read into memory at once; only
+# the parts which are actually used are read from disk. The colour limits and
+# the averaging onto the computational grid below go through the model slab
+# by slab. Only the 3D visualizations require the entire model in memory.
+#
 # You can get the data from the `SEG-website
 # <https://wiki.seg.org/wiki/SEG/EAGE_Salt_and_Overthrust_Models>`_ or via this
 # `direct link
@@ -68,7 +74,7 @@ plt.style.use('ggplot')
 path = '../data/SEG/'
 try:
     # Get resistivities if we already computed them
-    res = joblib.load(path+'res-model.lzma')
+    res = np.load(path+'res-model.npy', mmap_mode='r')
 
     # Get dimension
     nx, ny, nz = res.shape
@@ -98,34 +104,40 @@ except FileNotFoundError:  # THE ORIGINAL DATA ARE REQUIRED!
     # Fix salt resistivity
     res[v == 4482] = 30.
 
-    # Save it in compressed form
+    # Save it in uncompressed form
     # THE SEG/EAGE salt-model uses positive z downwards; discretize positive
     # upwards. Hence:
     # => for res, use np.flip(res, 2) to flip the z-direction
     res = np.flip(res, 2)
 
-    # Very fast, but not so effective (118.6 MB).
-    # joblib.dump(res, './res-model', compress=True)
+    # Store it in native byte order and Fortran order (fast z-slices).
+    np.save(path+'res-model.npy',
+            np.asfortranarray(res, dtype=np.float32))
 
-    # lzma: very slow, but very effective (~ 18.6 MB).
-    joblib.dump(res, path+'res-model.lzma')
+    # Load it as memory map.
+    del v, res
+    res = np.load(path+'res-model.npy', mmap_mode='r')
 
 # Create a discretize-mesh
 mesh = emg3d.TensorMesh(
         [np.ones(nx)*20., np.ones(ny)*20., np.ones(nz)*20.], x0='00N')
-models = {'res': np.log10(res.ravel('F'))}
 
 # Limit colour-range
 # We're cutting here the colour-spectrum at 50 Omega.m (affects only
-# the basement) to have a better resolution in the sediments.
-clim = np.log10([np.nanmin(res), 50])
+# the basement) to have a better resolution in the sediments. The minimum is
+# taken slab by slab, to not read the entire model at once.
+resmin = min(np.nanmin(res[:, :, k:k+20]) for k in range(0, nz, 20))
+clim = np.log10([resmin, 50])
 
 mesh
 
 ###############################################################################
 # 3D-slicer
 # ---------
+#
+# The 3D visualizations require the entire model in memory.
 
+models = {'res': np.log10(res.ravel('F'))}
 mesh.plot_3d_slicer(models['res'], zslice=-2000, clim=clim)
 
 ###############################################################################
@@ -154,6 +166,9 @@ p.add_mesh(dataset.threshold([1.47, 1.48]), name='vol', **dparams)
 p.camera_position = [(27000, 37000, 5800), (6600, 6600, -3300), (0, 0, 1)]
 p.show()
 
+# Free the memory of the entire model.
+del models, dataset
+
 ###############################################################################
 # Forward modelling
 # -----------------
@@ -186,9 +201,93 @@ grid
 ###############################################################################
 # Put the salt model onto the modelling mesh
 # ``````````````````````````````````````````
+#
+# The resistivities are volume-averaged from the fine mesh to the coarser
+# grid. On tensor meshes the volume averaging is separable: it consists of a
+# one-dimensional length averaging in each direction, which can be written as
+# sparse matrices. Applying these three matrices one after the other is the
+# same as ``emg3d.maps.grid2grid(mesh, res, grid, 'volume')``. Because the
+# averaging is separable we can also go through the fine model slab by slab
+# in z-direction; only one slab of the memory-mapped model has to be in memory
+# at any time.
+
+
+def volume_operator(nodes, new_nodes):
+    """Sparse matrix of the 1D length averaging from ``nodes``.
+
+    The outermost cells of the old nodes are extended if the new nodes reach
+    beyond them.
+
+    """
+
+    # Extend outermost cells.
+    nodes = nodes.copy()
+    nodes[0] = min(nodes[0], new_nodes[0])
+    nodes[-1] = max(nodes[-1], new_nodes[-1])
+
+    # All segments between old and new nodes within the new nodes.
+    points = np.unique(np.r_[nodes, new_nodes])
+    points = points[(points >= new_nodes[0]) & (points <= new_nodes[-1])]
+    centers = (points[1:]+points[:-1])/2
+
+    # Old and new cell of each segment, and its weight.
+    iold = np.searchsorted(nodes, centers)-1
+    inew = np.searchsorted(new_nodes, centers)-1
+    weight = np.diff(points)/np.diff(new_nodes)[inew]
+
+    return sparse.csr_matrix((weight, (inew, iold)),
+                             shape=(new_nodes.size-1, nodes.size-1))
+
+
+def volume_average(mesh, values, grid, nslab=20):
+    """Volume average ``values`` from ``mesh`` to ``grid``, by z-slabs."""
+
+    # The three 1D averaging operators.
+    wx = volume_operator(mesh.vectorNx, grid.vectorNx)
+    wy = volume_operator(mesh.vectorNy, grid.vectorNy)
+    wz = volume_operator(mesh.vectorNz, grid.vectorNz).tocsc()
+
+    nx, ny, nz = mesh.vnC
+    mx, my, mz = grid.vnC
+    new_values = np.zeros((mx*my, mz))
+
+    for k0 in range(0, nz, nslab):
+        k1 = min(k0+nslab, nz)
+
+        # Only this slab is read from the values.
+        slab = np.asarray(values[:, :, k0:k1], dtype=float)
+
+        # Average in x, then in y.
+        slab = (wx @ slab.reshape(nx, -1)).reshape(mx, ny, -1)
+        slab = (wy @ slab.transpose(1, 0, 2).reshape(ny, -1))
+        slab = slab.reshape(my, mx, -1).transpose(1, 0, 2)
+
+        # Add the contribution of this slab in z.
+        new_values += (wz[:, k0:k1] @ slab.reshape(mx*my, -1).T).T
+
+    return new_values.reshape(mx, my, mz)
+
+
+###############################################################################
+# Check on a small part of the model that the result is the same as with
+# ``grid2grid``.
+
+sub_mesh = emg3d.TensorMesh(
+        [np.ones(50)*20., np.ones(40)*20., np.ones(30)*20.], x0='00N')
+sub_grid = emg3d.TensorMesh(
+        [np.ones(10)*100., np.ones(8)*100., np.ones(6)*100.], x0='00N')
+sub_res = np.array(res[:50, :40, -30:], dtype=float)
+sub_diff = abs(emg3d.maps.grid2grid(sub_mesh, sub_res, sub_grid, 'volume') -
+               volume_average(sub_mesh, sub_res, sub_grid, nslab=7))
+print(f"Max. difference to grid2grid: {np.max(sub_diff):.2e}")
+
+
+###############################################################################
 
 # Interpolate resistivities from fine mesh to coarser grid
-cres = emg3d.maps.grid2grid(mesh, res, grid, 'volume')
+timer = emg3d.utils.Time()
+cres = volume_average(mesh, res, grid)
+print(f"Runtime of the volume averaging: {timer.runtime}")
 
 # Create model
 model = emg3d.Model(grid, property_x=cres, mapping='Resistivity')
@@ -9,6 +9,9 @@ original results are shown at the bottom of this example.
 
 """
 import emg3d
+import os
+import shutil
+import hashlib
 import empymod
 import numpy as np
 import matplotlib.pyplot as plt
@@ -72,10 +75,19 @@ freq_dense = np.logspace(
 ###############################################################################
 # Frequency-domain computation
 # ----------------------------
-
-# To store the info of each frequency.
-values = {}
 #
+# The frequencies are computed from high to low, using the fields of the
+# previous frequencies to predict a starting field for the next one. To use
+# several cores we split the frequencies into ``nchains`` independent chains,
+# which are computed in parallel; within each chain the previous fields are
+# still used for the starting field.
+#
+# Each finished frequency is stored in the directory ``name``. If the
+# computation is interrupted and run again, already computed frequencies are
+# loaded from there instead of being computed again. The file names contain a
+# checksum of the inputs, so that checkpoints of different inputs are never
+# reused.
+
 gridinput = {
     'res': res,               # Fullspace resistivity.
     'min_width': [20., 40.],  # Restr. the cell width within the survey domain.
@@ -84,74 +96,152 @@ gridinput = {
     'alpha': [1, 1.3, 0.01],  # Lower the alpha will improve the result, but
     'verb': 0,                # slow down computation.
 }
-#
+
+solver_opts = {
+    'sslsolver': True,
+    'semicoarsening': True,
+    'linerelaxation': True,
+}
+
+# Checksum of the inputs, part of the checkpoint file names.
+checksum = hashlib.md5(repr(
+    (src, rec, res, gridinput, solver_opts)).encode()).hexdigest()[:8]
+
+# Number of independent chains of frequencies (computed in parallel).
+nchains = 4
+
+
+def initial_guess(history, grid, frq):
+    r"""Predict the starting field for ``frq`` from previous frequencies.
+
+    The fields of the previous frequencies are linearly interpolated onto the
+    new grid (which is much cheaper than a cubic interpolation). If there are
+    two previous frequencies, the field is linearly extrapolated in
+    :math:`\sqrt{f}`, following the diffusive behaviour of the fields.
+
+    """
+    if len(history) == 0:
+        return emg3d.Field(grid, freq=frq)
+
+    # Interpolate the previous fields onto the new grid.
+    fields = [emg3d.maps.grid2grid(old_grid, old_field, grid,
+                                   method='linear', extrapolate=False)
+              for old_grid, old_field, _ in history]
+
+    if len(history) == 1:
+        return emg3d.Field(grid, fields[0], freq=frq)
+
+    # Extrapolate linearly in sqrt(f) from the last two frequencies.
+    sf1, sf2 = np.sqrt(history[-1][2]), np.sqrt(history[-2][2])
+    fact = (np.sqrt(frq) - sf1)/(sf1 - sf2)
+    return emg3d.Field(grid, fields[-1] + fact*(fields[-1]-fields[-2]),
+                       freq=frq)
+
+
+def compute_chain(freqs, warm_start=True, path=name):
+    """Compute the data for a chain of frequencies, going from high to low."""
+
+    # To store the info of each frequency.
+    values = {}
+
+    # Grids, fields, and frequencies of the last two computed frequencies.
+    history = []
+
+    for frq in freqs:
+
+        # Key and file name are used to store the data etc.
+        key = int(frq*1e6)
+        fname = f"{path}/{key}-{checksum}.npz"
+
+        # Load the checkpoint if this frequency was already computed.
+        if os.path.isfile(fname):
+            values[key] = emg3d.load(fname, verb=0)['thislog']
+            history = []
+            continue
+
+        print(f"  {frq:10.6f} Hz")
+
+        # Initiate log for this frequency.
+        thislog = {}
+        thislog['freq'] = frq
+
+        # Get cell widths and origin in each direction
+        xx, x0, hix = emg3d.meshes.get_hx_h0(
+            freq=frq, fixed=src[0], domain=[-200, 1100], **gridinput)
+        yz, yz0, hiyz = emg3d.meshes.get_hx_h0(
+            freq=frq, fixed=src[1], domain=[-50, 50], **gridinput)
+
+        # Store values in log.
+        thislog['alpha'] = [np.min([hix['amin'], hiyz['amin']]),
+                            np.max([hix['amax'], hiyz['amax']])]
+        thislog['dminmax'] = [np.min([hix['dmin'], hiyz['dmin']]),
+                              np.max([hix['dmax'], hiyz['dmax']])]
+
+        # Initiate mesh.
+        grid = emg3d.TensorMesh([xx, yz, yz], x0=np.array([x0, yz0, yz0]))
+        # print(grid)
+        thislog['nC'] = grid.nC  # Store number of cells in log.
+
+        # Predict the starting electric field from the last ones (can speed-up
+        # the computation).
+        efield = initial_guess(history, grid, frq)
+
+        # Generate model
+        model = emg3d.Model(grid, property_x=res, mapping='Resistivity')
+
+        # Define source.
+        sfield = emg3d.get_source_field(
+            grid, [src[0], src[1], src[2], 0, 0], frq, strength=0)
+
+        # Solve the system.
+        info = emg3d.solve(
+            grid, model, sfield, efield=efield,
+            verb=-1, return_info=True, **solver_opts,
+        )
+
+        # Store info
+        thislog['info'] = info
+
+        # Store value
+        thislog['data'] = emg3d.get_receiver(
+                grid, efield.fx, (rec[0], rec[1], rec[2]))
+
+        # Store thislog in values, and as checkpoint on disk.
+        values[key] = thislog
+        emg3d.save(fname, thislog=thislog, verb=0)
+
+        # Store grid and field for the starting field of the next frequency.
+        if warm_start:
+            history = history[-1:] + [(grid, efield, frq)]
+
+    return values
+
+
+###############################################################################
+
+# Directory for the checkpoints.
+os.makedirs(name, exist_ok=True)
+
+# Split the frequencies, going from high to low, into chains.
+chains = np.array_split(Fourier.freq_calc[::-1], nchains)
+
 # Start the timer.
 runtime = emg3d.utils.Time()
-#
-# Loop over frequencies, going from high to low.
-old_grid = None
-for fi, frq in enumerate(Fourier.freq_calc[::-1]):
-    print(f"  {fi+1:2}/{Fourier.freq_calc.size} :: {frq:10.6f} Hz")
-
-    # Initiate log for this frequency.
-    thislog = {}
-    thislog['freq'] = frq
-
-    # Get cell widths and origin in each direction
-    xx, x0, hix = emg3d.meshes.get_hx_h0(
-        freq=frq, fixed=src[0], domain=[-200, 1100], **gridinput)
-    yz, yz0, hiyz = emg3d.meshes.get_hx_h0(
-        freq=frq, fixed=src[1], domain=[-50, 50], **gridinput)
-
-    # Store values in log.
-    thislog['alpha'] = [np.min([hix['amin'], hiyz['amin']]),
-                        np.max([hix['amax'], hiyz['amax']])]
-    thislog['dminmax'] = [np.min([hix['dmin'], hiyz['dmin']]),
-                          np.max([hix['dmax'], hiyz['dmax']])]
-
-    # Initiate mesh.
-    grid = emg3d.TensorMesh([xx, yz, yz], x0=np.array([x0, yz0, yz0]))
-    # print(grid)
-    thislog['nC'] = grid.nC  # Store number of cells in log.
-
-    # Interpolate the starting electric field from the last one (can speed-up
-    # the computation).
-    if fi == 0:
-        efield = emg3d.Field(grid, freq=frq)
-    else:
-        efield = emg3d.maps.grid2grid(old_grid, efield, grid,
-                                      method='cubic', extrapolate=False)
-        efield = emg3d.Field(grid, efield, freq=frq)
-
-    # Generate model
-    model = emg3d.Model(grid, property_x=res, mapping='Resistivity')
-
-    # Define source.
-    sfield = emg3d.get_source_field(
-        grid, [src[0], src[1], src[2], 0, 0], frq, strength=0)
-
-    # Solve the system.
-    info = emg3d.solve(
-        grid, model, sfield, efield=efield,
-        verb=-1, return_info=True,
-        sslsolver=True,  semicoarsening=True, linerelaxation=True,
-    )
-
-    # Store info
-    thislog['info'] = info
-
-    # Store value
-    thislog['data'] = emg3d.get_receiver(
-            grid, efield.fx, (rec[0], rec[1], rec[2]))
-
-    # Store thislog in values.
-    values[int(frq*1e6)] = thislog
-
-    # Store the grid for the interpolation.
-    old_grid = grid
-
-# Stop the timer.
-total_time = runtime.runtime
+
+# Compute the chains in parallel.
+out = emg3d.simulations.process_map(
+        compute_chain,
+        chains,
+        max_workers=nchains,  # Adjust max worker here!
+)
+
+# Stop the timer; this is the wall-clock time of all chains.
+wall_time = runtime.elapsed
+
+# Collect the values of all chains.
+values = {}
+for chain_values in out:
+    values.update(chain_values)
 
 # Store data and info to disk
 emg3d.save(name+'.npz', values=values)
@@ -172,8 +262,49 @@ for key, value in values.items():
           f"a: {value['dminmax'][0]:5.0f} / {value['dminmax'][1]:7.0f}")
     runtime += value['info']['time']
 
-print(f"\n                **** TOTAL RUNTIME :: "
-      f"{runtime//60:.0f} min {runtime%60:.1f} s ****\n")
+# The summed solve time is the runtime a single process would need; the
+# wall-clock time is what the parallel chains actually took.
+print(f"\n                **** SUMMED SOLVE TIME :: "
+      f"{runtime//60:.0f} min {runtime%60:.1f} s ****")
+print(f"                **** WALL-CLOCK TIME   :: "
+      f"{wall_time//60:.0f} min {wall_time%60:.1f} s ****\n")
+
+
+###############################################################################
+# Iterations saved by the starting field
+# ``````````````````````````````````````
+#
+# To see what we gain from the predicted starting fields we compute the same
+# frequencies again, but this time always starting from a zero field.
+
+os.makedirs(name+'-cold', exist_ok=True)
+out_cold = emg3d.simulations.process_map(
+        compute_chain,
+        chains,
+        [False]*nchains,          # No warm start.
+        [name+'-cold']*nchains,   # Separate checkpoints.
+        max_workers=nchains,
+)
+values_cold = {}
+for chain_values in out_cold:
+    values_cold.update(chain_values)
+
+freqs = Fourier.freq_calc[::-1]
+it_warm = [values[str(int(f*1e6))]['info']['it_mg'] for f in freqs]
+it_cold = [values_cold[int(f*1e6)]['info']['it_mg'] for f in freqs]
+
+plt.figure()
+plt.title(f"MG cycles: {sum(it_warm)} (warm) vs {sum(it_cold)} (cold)")
+plt.semilogx(freqs, it_cold, 'C1o-', label='zero starting field')
+plt.semilogx(freqs, it_warm, 'C0o-', label='predicted starting field')
+plt.xlabel('Frequency (Hz)')
+plt.ylabel('Number of MG cycles')
+plt.legend()
+plt.show()
+
+# Remove the checkpoints.
+shutil.rmtree(name)
+shutil.rmtree(name+'-cold')
 
 
 ###############################################################################
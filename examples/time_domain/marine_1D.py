@@ -6,6 +6,9 @@ Example how to use ``emg3d`` to model time-domain data using FFTLog.
 
 """
 import emg3d
+import os
+import shutil
+import hashlib
 import empymod
 import numpy as np
 import matplotlib.pyplot as plt
@@ -122,9 +125,13 @@ freq_dense = np.logspace(
 ###############################################################################
 # Frequency-domain computation
 # ----------------------------
-
-# To store the info of each frequency.
-values = {}
+#
+# Each frequency has its own grid and is computed independently, so we compute
+# the frequencies in parallel. Each finished frequency is stored in the
+# directory ``name``. If the computation is interrupted and run again, already
+# computed frequencies are loaded from there instead of being computed again.
+# The file names contain a checksum of the inputs, so that checkpoints of
+# different inputs are never reused.
 
 gridinput = {
     'min_width': 100,    # Fix cell width within the survey domain to 100 m.
@@ -133,19 +140,19 @@ gridinput = {
     'verb': 0,
 }
 
-# Start the timer.
-runtime = emg3d.utils.Time()
+solver_opts = {
+    'sslsolver': True,
+    'semicoarsening': True,
+    'linerelaxation': True,
+}
 
-# Loop over frequencies, going from high to low.
-for fi, frq in enumerate(Fourier.freq_calc[::-1]):
-    print(f"  {fi+1:2}/{Fourier.freq_calc.size} :: {frq:10.6f} Hz")
+# Checksum of the inputs, part of the checkpoint file names.
+checksum = hashlib.md5(repr(
+    (src, rec, res, depth, gridinput, solver_opts)).encode()).hexdigest()[:8]
 
-    # Key is used to store the data etc.
-    key = int(frq*1e6)
 
-    # Initiate log for this frequency.
-    values[key] = {}
-    values[key]['freq'] = frq
+def get_grid(frq):
+    """Return the computational grid and its info for frequency ``frq``."""
 
     # Get cell widths and origin in each direction
     xx, x0, hix = emg3d.meshes.get_hx_h0(
@@ -157,16 +164,45 @@ for fi, frq in enumerate(Fourier.freq_calc[::-1]):
         freq=frq, res=[0.3, 1., 1e5], domain=[-2300, 0], **gridinput,
         fixed=[depth[2], depth[3], depth[0]])
 
-    # Store values in log.
-    values[key]['alpha'] = [np.min([hix['amin'], hiy['amin'], hiz['amin']]),
-                            np.max([hix['amax'], hiy['amax'], hiz['amax']])]
-    values[key]['dminmax'] = [np.min([hix['dmin'], hiy['dmin'], hiz['dmin']]),
-                              np.max([hix['dmax'], hiy['dmax'], hiz['dmax']])]
-
     # Initiate mesh.
     grid = emg3d.TensorMesh([xx, yy, zz], x0=np.array([x0, y0, z0]))
+
+    return grid, (hix, hiy, hiz)
+
+
+def compute_frequency(frq):
+    """Compute the data for one frequency."""
+
+    # Key and file name are used to store the data etc.
+    key = int(frq*1e6)
+    fname = f"{name}/{key}-{checksum}.npz"
+
+    # Load the checkpoint if this frequency was already computed; flag it as
+    # loaded, so its runtime is not counted for this run.
+    if os.path.isfile(fname):
+        thislog = emg3d.load(fname, verb=0)['thislog']
+        thislog['loaded'] = True
+        return thislog
+
+    print(f"  {frq:10.6f} Hz")
+
+    # Start the timer of this task.
+    timer = emg3d.utils.Time()
+
+    # Initiate log for this frequency.
+    thislog = {}
+    thislog['freq'] = frq
+
+    # Get the mesh.
+    grid, (hix, hiy, hiz) = get_grid(frq)
     # print(grid)
-    values[key]['nC'] = grid.nC  # Store number of cells in log.
+    thislog['nC'] = grid.nC  # Store number of cells in log.
+
+    # Store values in log.
+    thislog['alpha'] = [np.min([hix['amin'], hiy['amin'], hiz['amin']]),
+                        np.max([hix['amax'], hiy['amax'], hiz['amax']])]
+    thislog['dminmax'] = [np.min([hix['dmin'], hiy['dmin'], hiz['dmin']]),
+                          np.max([hix['dmax'], hiy['dmax'], hiz['dmax']])]
 
     # Generate model (interpolate on log-scale from our coarse model).
     res_x = 10**emg3d.maps.grid2grid(
@@ -183,22 +219,89 @@ for fi, frq in enumerate(Fourier.freq_calc[::-1]):
 
     # Solve the system.
     efield, info = emg3d.solve(
-        grid, model, sfield, verb=-1, return_info=True,
-        sslsolver=True,  semicoarsening=True, linerelaxation=True,
+        grid, model, sfield, verb=-1, return_info=True, **solver_opts,
     )
 
     # Store info
-    values[key]['info'] = info
+    thislog['info'] = info
 
     # Store value
-    values[key]['data'] = emg3d.get_receiver(
+    thislog['data'] = emg3d.get_receiver(
             grid, efield.fx, (rec[0], rec[1], rec[2]))
 
+    # Store runtime of this task.
+    thislog['runtime'] = timer.elapsed
+
+    # Store checkpoint on disk.
+    emg3d.save(fname, thislog=thislog, verb=0)
+
+    return thislog
+
+
+###############################################################################
+# Scheduling
+# ``````````
+#
+# Low frequencies have much bigger grids than high frequencies, and take
+# therefore much longer. If the longest tasks are started last, the other
+# workers are idle at the end. We therefore estimate the cost of each
+# frequency as the number of cells of its grid times the number of multigrid
+# cycles, and start the most expensive frequencies first. The number of
+# cycles is taken from a previous run, if there is one, otherwise it is
+# assumed to be the same for all frequencies.
+#
+# The workers take the next frequency from the queue whenever they are done
+# with one, so no worker is idle while there are frequencies left.
+
+# Frequencies, going from high to low.
+freqs = Fourier.freq_calc[::-1]
+
+# Number of MG cycles from a previous run.
+if os.path.isfile(name+'.npz'):
+    previous = emg3d.load(name+'.npz', verb=0)['values']
+    it_mg = {int(k): v['info']['it_mg'] for k, v in previous.items()}
+else:
+    it_mg = {}
+
+# Estimated cost of each frequency, and order from most to least expensive.
+cost = [get_grid(f)[0].nC*it_mg.get(int(f*1e6), 1) for f in freqs]
+freqs = freqs[np.argsort(cost)[::-1]]
+
+
+###############################################################################
+
+# Directory for the checkpoints.
+os.makedirs(name, exist_ok=True)
+
+# Number of workers.
+nworkers = 4  # Adjust max worker here!
+
+# Start the timer.
+runtime = emg3d.utils.Time()
+
+# Compute the frequencies in parallel.
+out = emg3d.simulations.process_map(
+        compute_frequency,
+        freqs,
+        max_workers=nworkers,
+)
+
 # Stop the timer.
 total_time = runtime.runtime
 
-# Store data and info to disk
+# Utilisation of the workers: busy time over available time. Only the
+# frequencies computed in this run count, not the ones loaded from
+# checkpoints.
+busy = sum([thislog['runtime'] for thislog in out
+            if not thislog.get('loaded', False)])
+print(f"Worker utilisation: {100*busy/(nworkers*runtime.elapsed):.0f} %")
+
+# Collect the values of all frequencies.
+values = {int(frq*1e6): thislog for frq, thislog in zip(freqs, out)}
+
+# Store data and info to disk, and remove the checkpoints.
 emg3d.save(name+'.npz', values=values)
+shutil.rmtree(name)
 
 
 ###############################################################################
@@ -126,6 +126,123 @@ plt.axis('equal')
 plt.show()
 
 
+###############################################################################
+# Estimating memory and runtime
+# -----------------------------
+#
+# Before running a big model it is good to know roughly how much memory and
+# time it will need. The memory can be estimated from the arrays the solver
+# holds: on the finest grid about five complex fields of the size of the
+# number of edges (electric field, source field, residual, and temporary
+# fields), and four real-valued model volumes of the size of the number of
+# cells. With full coarsening each coarser level has an eighth of the cells
+# of the previous one, which adds about 1/7 for all coarser levels together.
+# BiCGSTAB requires about eight further fields of the finest grid. On top of
+# that comes the memory of Python and the loaded modules, which we take from
+# the smallest measured model. Note that ``memory_profiler`` reports MiB
+# (:math:`2^{20}` bytes), so the estimate is in MiB too.
+
+
+def estimate_memory(nx, ny, nz, sslsolver=False):
+    """Estimate the memory (MiB) of the arrays of a solve."""
+    ncells = nx*ny*nz
+    nedges = (nx*(ny+1)*(nz+1) + (nx+1)*ny*(nz+1) + (nx+1)*(ny+1)*nz)
+    nbytes = 8/7*(5*16*nedges + 4*8*ncells)
+    if sslsolver:
+        nbytes += 8*16*nedges
+    return nbytes/2**20
+
+
+# Python and modules, from the smallest model.
+base_memory = memory[0] - estimate_memory(*[nsizes[0]]*3)
+
+###############################################################################
+# The runtime is, for this model, about proportional to the number of cells.
+# The exact relation depends on the machine, so we calibrate a power law,
+# :math:`t = a n^b`, with the sizes measured above.
+
+b, log_a = np.polyfit(np.log(nsizes**3), np.log(runtime), 1)
+
+
+def estimate_runtime(nx, ny, nz):
+    """Estimate the runtime (s) of a solve from the calibrated power law."""
+    return np.exp(log_a)*(nx*ny*nz)**b
+
+
+print(f"Calibrated runtime: t = {np.exp(log_a):.2e} s * n^{b:.2f}\n")
+for nx in [*nsizes, 256, 384, 512]:
+    print(f"  => {nx}^3 = {nx**3:12,d} cells :: "
+          f"{base_memory+estimate_memory(nx, nx, nx):9.1f} MiB; "
+          f"{estimate_runtime(nx, nx, nx):9.1f} s")
+
+###############################################################################
+# Plot estimate vs measurement
+# ````````````````````````````
+
+est_memory = base_memory + np.array(
+        [estimate_memory(nx, nx, nx) for nx in nsizes])
+est_runtime = estimate_runtime(nsizes, nsizes, nsizes)
+
+fig, axs = plt.subplots(1, 2, figsize=(9, 4))
+axs[0].set_title('Runtime')
+axs[0].loglog(nsizes**3/1e6, runtime, '.-', label='measured')
+axs[0].loglog(nsizes**3/1e6, est_runtime, 'k--', label='estimated')
+axs[0].set_xlabel('Number of cells (in millions)')
+axs[0].set_ylabel('CPU (s)')
+axs[0].legend()
+axs[1].set_title('Memory')
+axs[1].loglog(nsizes**3/1e6, memory/1e3, '.-', label='measured')
+axs[1].loglog(nsizes**3/1e6, est_memory/1e3, 'k--', label='estimated')
+axs[1].set_xlabel('Number of cells (in millions)')
+axs[1].set_ylabel('RAM (GB)')
+plt.tight_layout()
+plt.show()
+
+
+###############################################################################
+# Several cores
+# -------------
+#
+# The smoothers and the other multigrid kernels of ``emg3d`` are jitted with
+# numba, but run single-threaded. A single solve uses therefore only one core,
+# also with ``linerelaxation=True`` and ``semicoarsening=True``. Several cores
+# are used by solving independent problems (e.g., different sources or
+# frequencies) at the same time in separate processes; in that case you should
+# limit any threaded libraries to one thread per process (e.g., by setting the
+# environment variable ``OMP_NUM_THREADS=1``).
+#
+# Here we solve ``ntasks`` times the same model with an increasing number of
+# workers, and compute the speed-up with respect to one worker. Set ``nx_par``
+# to 128 or 256 to reproduce the bigger models from above.
+
+nx_par = 48
+ntasks = 8
+workers = np.array([1, 2, 4, 8])
+walltime = np.zeros(workers.shape)
+
+# Loop over number of workers
+for i, nworkers in enumerate(workers):
+    print(f"  => {nworkers} worker(s)")
+    timer = emg3d.utils.Time()
+    emg3d.simulations.process_map(
+            compute, [nx_par]*ntasks, max_workers=nworkers)
+    walltime[i] = timer.elapsed
+
+
+###############################################################################
+# Plot speed-up
+# `````````````
+
+plt.figure()
+plt.title(f"Speed-up for {ntasks} solves of {nx_par}^3 cells")
+plt.plot(workers, walltime[0]/walltime, '.-', label='measured')
+plt.plot(workers, workers, 'k--', label='ideal')
+plt.xlabel('Number of workers')
+plt.ylabel('Speed-up (-)')
+plt.legend()
+plt.show()
+
+
 ###############################################################################
 
 emg3d.Report('memory_profiler')
@@ -0,0 +1,189 @@
+"""
+9. Benchmark suite
+==================
+
+The figures in :ref:`sphx_glr_gallery_tools_CPU-and-RAM.py` are from a
+one-off run. To track the performance of ``emg3d`` over time the same
+functions have to be timed in a reproducible way, every time, and compared to
+previous results.
+
+This example is such a benchmark suite. It times the main functions of
+``emg3d`` for several model sizes, appends the results to a JSON file, and
+compares them to a stored baseline. Timings which are slower than the
+baseline by more than a given threshold are flagged as regressions.
+
+The results are stored under the version of ``emg3d``; for development
+versions this includes the commit hash. The first run stores its results as
+baseline, against which all later runs are compared. Both files are kept on
+disk; set ``fresults`` and ``fbaseline`` to keep them in a permanent place,
+and delete the baseline file to start a new baseline.
+
+"""
+import emg3d
+import os
+import json
+import datetime
+import numpy as np
+import matplotlib.pyplot as plt
+plt.style.use('ggplot')
+
+
+###############################################################################
+# Settings
+# --------
+
+sizes = [16, 32, 48]    # Number of cells in each direction.
+repeat = 3              # The minimum of `repeat` runs is taken.
+threshold = 0.2         # Flag timings slower by more than 20 %.
+fresults = 'benchmark-results.json'
+fbaseline = 'benchmark-baseline.json'
+
+
+###############################################################################
+# Benchmarks
+# ----------
+
+def timeit(fct):
+    """Return the minimum runtime (s) of ``repeat`` calls of ``fct()``."""
+    times = []
+    for _ in range(repeat):
+        timer = emg3d.utils.Time()
+        fct()
+        times.append(timer.elapsed)
+    return min(times)
+
+
+def benchmarks(nx):
+    """Return the benchmarks for a model of ``nx`` x ``nx`` x ``nx`` cells.
+
+    - Homogeneous fullspace of 1 S/m, cell width of 50 m.
+    - x-directed source at the origin, frequency 1 Hz.
+    - Five inline receivers, the last one 5 cells from the boundary.
+    - A second grid of half the number of cells for the interpolations.
+
+    """
+
+    hx = np.ones(nx)*50
+    x0 = -nx//2*50
+    grid = emg3d.TensorMesh([hx, hx, hx], x0=(x0, x0, x0))
+    model = emg3d.Model(grid, property_x=np.ones(grid.vnC),
+                        mapping='Conductivity')
+    new_grid = emg3d.TensorMesh([hx[::2]*2]*3, x0=(x0, x0, x0))
+
+    src = [0, 0, 0, 0, 0]
+    freq = 1.0
+    rec = (np.arange(1, 6)*(nx-10)*5, 0, 0)
+    sfield = emg3d.get_source_field(grid, src, freq)
+    efield = emg3d.solve(grid, model, sfield, verb=1)
+
+    survey = emg3d.surveys.Survey(
+            'Benchmark', (0, 0, 0, 0, 0), (*rec, 0, 0), freq)
+    sim_opts = {'survey': survey, 'grid': grid, 'model': model,
+                'gridding': 'same', 'max_workers': 1,
+                'solver_opts': {'verb': 1},
+                'data_weight_opts': {'gamma_d': 0, 'beta_d': 0, 'beta_f': 0,
+                                     'min_off': 0, 'noise_floor': 0}}
+
+    # Observed data, required by the gradient.
+    sim = emg3d.simulations.Simulation('Observed', **sim_opts)
+    sim._tqdm_opts['disable'] = True
+    sim.compute(observed=True)
+
+    def simulation(what):
+        """Create a new simulation, and compute fields or gradient."""
+        sim = emg3d.simulations.Simulation('Benchmark', **sim_opts)
+        sim._tqdm_opts['disable'] = True
+        if what == 'compute':
+            sim.compute()
+        else:
+            sim.gradient
+
+    return {
+        'solve': lambda: emg3d.solve(grid, model, sfield, verb=1),
+        'solve (SC+LR+BiCGSTAB)': lambda: emg3d.solve(
+            grid, model, sfield, semicoarsening=True, linerelaxation=True,
+            sslsolver=True, verb=1),
+        'get_source_field': lambda: emg3d.get_source_field(grid, src, freq),
+        'get_receiver': lambda: emg3d.get_receiver(grid, efield.fx, rec),
+        'grid2grid': lambda: emg3d.maps.grid2grid(
+            grid, model.property_x, new_grid, method='volume'),
+        'interpolate2grid': lambda: model.interpolate2grid(grid, new_grid),
+        'Simulation.compute': lambda: simulation('compute'),
+        'Simulation.gradient': lambda: simulation('gradient'),
+    }
+
+
+# Fourier transform of the response of 14 frequencies; independent of size.
+fourier = emg3d.Fourier(time=np.logspace(-2, 1, 201), fmin=0.05, fmax=21,
+                        ft='fftlog', ftarg={'pts_per_dec': 5, 'q': 0})
+fdata = 1/(1+1j*fourier.freq_calc)
+
+
+###############################################################################
+# Run
+# ---
+
+timings = {'Fourier.freq2time': timeit(lambda: fourier.freq2time(fdata, 1))}
+for nx in sizes:
+    for name, fct in benchmarks(nx).items():
+        timings[f"{name} (nx={nx})"] = timeit(fct)
+
+record = {
+    'version': emg3d.__version__,
+    'date': datetime.datetime.now().isoformat(timespec='seconds'),
+    'timings': timings,
+}
+
+# Append the record to the results.
+results = []
+if os.path.isfile(fresults):
+    with open(fresults, 'r') as f:
+        results = json.load(f)
+results.append(record)
+with open(fresults, 'w') as f:
+    json.dump(results, f, indent=2)
+
+
+###############################################################################
+# Compare to baseline
+# -------------------
+
+if os.path.isfile(fbaseline):
+    with open(fbaseline, 'r') as f:
+        baseline = json.load(f)
+else:
+    baseline = record
+    with open(fbaseline, 'w') as f:
+        json.dump(baseline, f, indent=2)
+
+print(f"emg3d {record['version']} vs baseline emg3d {baseline['version']}\n")
+ratios = {}
+for name, runtime in timings.items():
+    if name not in baseline['timings']:
+        continue
+    ratios[name] = runtime/baseline['timings'][name]
+    flag = 'REGRESSION' if ratios[name] > 1+threshold else ''
+    print(f"{name:>36}: {runtime:8.4f} s; {ratios[name]:5.2f}x  {flag}")
+
+regressions = [k for k, v in ratios.items() if v > 1+threshold]
+print(f"\n{len(regressions)} regression(s) above {threshold*100:.0f} %.")
+
+
+###############################################################################
+# Plot
+# ----
+
+plt.figure(figsize=(9, 6))
+plt.barh(list(ratios.keys()), list(ratios.values()),
+         color=['C0' if v <= 1+threshold else 'C1' for v in ratios.values()])
+plt.axvline(1, c='k')
+plt.axvline(1+threshold, c='k', ls='--', label='Threshold')
+plt.xlabel('Runtime relative to baseline (-)')
+plt.legend()
+plt.tight_layout()
+plt.show()
+
+
+###############################################################################
+
+emg3d.Report()
@@ -0,0 +1,337 @@
+"""
+3. Many sources on one grid
+===========================
+
+Surveys have often many source positions for the same frequency. The solver
+:func:`emg3d.solver.solve` takes exactly one source field, so each source
+requires its own solve. However, everything that does not depend on the
+source has to be created only once: the computational grid, the model, and
+the source-independent solver settings.
+
+In this example we compare two ways of computing many sources on one grid:
+
+1. A simple loop over :func:`emg3d.solver.solve`, where grid and model are
+   created once and shared by all sources;
+2. one :class:`emg3d.simulations.Simulation` for all sources, which shares
+   grid and model as well, and distributes the sources over several
+   processes.
+
+Note that the multigrid cycles themselves are still carried out source by
+source; the right-hand sides are not solved together.
+
+"""
+import emg3d
+import os
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.colors import LogNorm
+plt.style.use('ggplot')
+
+
+###############################################################################
+# Survey
+# ------
+#
+# A towline of sources, 50 m above the seafloor, and a line of receivers on
+# the seafloor; all are x-directed electric dipoles.
+
+zwater = 1000                      # Water depth.
+srcx = np.arange(8)*500-1000       # Source positions (m).
+recx = np.arange(2, 41)*200-1000   # Receiver positions (m).
+freq = 1.0                         # Frequency (Hz).
+
+survey = emg3d.surveys.Survey(
+    name='Towline',
+    sources=(srcx, 0, 50-zwater, 0, 0),
+    receivers=(recx, 0, -zwater, 0, 0),
+    frequencies=freq,
+)
+
+###############################################################################
+# Mesh and model
+# --------------
+#
+# The mesh is created once for all sources, and has to cover the whole
+# survey.
+
+ginp = {'freq': freq, 'min_width': 100, 'verb': 0}
+xx, x0 = emg3d.meshes.get_hx_h0(
+    res=[0.3, 1.], fixed=srcx[0], domain=[srcx[0]-500, recx[-1]+500], **ginp)
+yy, y0 = emg3d.meshes.get_hx_h0(
+    res=[0.3, 1.], fixed=0, domain=[-500, 500], **ginp)
+zz, z0 = emg3d.meshes.get_hx_h0(
+    res=[0.3, 1., 0.3], domain=[-2500, 0],
+    fixed=[-zwater, 0, -2100], **ginp)
+grid = emg3d.TensorMesh([xx, yy, zz], x0=np.array([x0, y0, z0]))
+grid
+
+###############################################################################
+
+# Layered background with a resistive target.
+res_x = 1e8*np.ones(grid.vnC)                 # Air
+res_x[:, :, grid.vectorCCz <= 0] = 0.3        # Water
+res_x[:, :, grid.vectorCCz <= -zwater] = 1.   # Background
+xt = (grid.vectorCCx >= 0) & (grid.vectorCCx <= 5000)
+yt = abs(grid.vectorCCy) <= 1000
+zt = (grid.vectorCCz >= -2100) & (grid.vectorCCz <= -1800)
+res_x[np.ix_(xt, yt, zt)] = 100
+
+model = emg3d.Model(grid, property_x=res_x, mapping='Resistivity')
+
+# Solver settings, the same for both approaches.
+solver_opts = {
+    'sslsolver': True,
+    'semicoarsening': True,
+    'linerelaxation': True,
+    'verb': 1,
+}
+
+
+###############################################################################
+# 1. Loop over sources
+# --------------------
+#
+# Grid, model, and solver settings are shared; only the source field changes
+# from one source to the next.
+#
+# For many sources on big grids the fields of all sources do not fit into
+# memory. We therefore only keep the data in memory, and write the field of
+# each source to a scratch file on disk, from where it can be read again
+# later. Memory-wise we only ever hold one field in memory.
+#
+# The computation and the writing to disk are timed separately, so that the
+# time of the loop can be compared to the simulation below.
+
+# Scratch file for the fields of all sources.
+scratch = np.lib.format.open_memmap(
+        'many-sources-efields.npy', mode='w+', dtype=complex,
+        shape=(srcx.size, grid.nE))
+
+time_loop = 0.
+time_write = 0.
+data_loop = np.zeros((srcx.size, recx.size), dtype=complex)
+for i, sx in enumerate(srcx):
+
+    # Compute the field and the data of this source.
+    timer = emg3d.utils.Time()
+    sfield = emg3d.get_source_field(grid, [sx, 0, 50-zwater, 0, 0], freq)
+    efield = emg3d.solve(grid, model, sfield, **solver_opts)
+    data_loop[i, :] = emg3d.get_receiver(
+            grid, efield.fx, (recx, recx*0, -zwater))
+    time_loop += timer.elapsed
+
+    # Write the field to the scratch file.
+    timer = emg3d.utils.Time()
+    scratch[i, :] = efield.field
+    time_write += timer.elapsed
+
+# Ensure everything is written to disk.
+timer = emg3d.utils.Time()
+scratch.flush()
+time_write += timer.elapsed
+
+print(f"Loop over {srcx.size} sources: {time_loop:.1f} s")
+print(f"Writing the fields to disk: {time_write:.1f} s")
+
+
+###############################################################################
+# 2. One simulation for all sources
+# ---------------------------------
+#
+# The simulation shares the same grid and model with all sources
+# (``gridding='same'``), and computes the sources in parallel.
+
+simulation = emg3d.simulations.Simulation(
+    name='Towline Simulation',
+    survey=survey,
+    grid=grid,
+    model=model,
+    gridding='same',  # Same grid as for input model.
+    max_workers=4,    # For parallel workers, adjust if you have more.
+    solver_opts=solver_opts,
+)
+
+runtime = emg3d.utils.Time()
+simulation.compute()
+time_sim = runtime.elapsed
+print(f"Simulation with {srcx.size} sources: {time_sim:.1f} s")
+
+data_sim = survey.data.synthetic.data[:, :, 0]
+
+
+###############################################################################
+# Compare
+# -------
+#
+# Both approaches yield, of course, the same responses.
+
+plt.figure()
+plt.title(f"Loop: {time_loop:.0f} s; Simulation: {time_sim:.0f} s")
+for i in [0, srcx.size//2, srcx.size-1]:
+    plt.plot(recx/1e3, abs(data_loop[i, :]), f"C{i%10}-",
+             label=f"Source at x = {srcx[i]/1e3:.1f} km")
+    plt.plot(recx/1e3, abs(data_sim[i, :]), 'k.')
+plt.xlabel('Receiver x (km)')
+plt.ylabel('$|E_x|$ (V/m)')
+plt.yscale('log')
+plt.legend()
+plt.show()
+
+print(f"Max. rel. difference: "
+      f"{np.max(abs(data_loop-data_sim)/abs(data_loop)):.2e}")
+
+
+###############################################################################
+# Stream the fields from disk
+# ---------------------------
+#
+# Quantities which need the fields of all sources, e.g., the gradient of the
+# misfit, can be accumulated source by source, reading one field after the
+# other from the scratch file. The gradient would additionally require the
+# back-propagated field of each source, which is one more solve per source.
+# To keep this example short, the illumination of the survey, the sum of
+# :math:`|E_x|^2` over all sources, stands in for it here; it is accumulated
+# in exactly the same way.
+
+illumination = np.zeros(grid.vnEx)
+for i in range(srcx.size):
+    efield = emg3d.Field(grid, np.array(scratch[i, :]), freq=freq)
+    illumination += abs(efield.fx)**2
+
+grid.plot_3d_slicer(
+        illumination.ravel('F'), v_type='Ex', zslice=-zwater,
+        xlim=(-2000, 8000), ylim=(-3000, 3000), zlim=(-3000, 500),
+        pcolor_opts={'norm': LogNorm()})
+
+# Remove the scratch file.
+del scratch
+os.remove('many-sources-efields.npy')
+
+
+###############################################################################
+# Source fields for several frequencies
+# -------------------------------------
+#
+# The source field is the source current density :math:`\mathbf{J}_s`,
+# distributed onto the edges of the grid, multiplied by :math:`-s\mu_0`. The
+# geometric part, which edges a source touches with which weight, does not
+# depend on frequency. If the grid stays the same, the source fields for other
+# frequencies are therefore obtained by a simple scaling of the source fields
+# of one frequency, for all sources at once. As :math:`s = -i\omega`, the
+# ratio of :math:`-s\mu_0` of two frequencies is simply the ratio of the
+# frequencies. (The source fields of this one frequency are still created
+# source by source with :func:`emg3d.fields.get_source_field`.)
+
+def scale_sources(sources, sfield, freq):
+    """Scale source fields ``sources``, computed as ``sfield``, to ``freq``."""
+    return sources*freq/sfield.freq
+
+
+freqs = np.array([0.1, 0.3, 1.0, 3.0])
+
+# Direct computation, for each source and frequency.
+timer = emg3d.utils.Time()
+direct = np.array([[emg3d.get_source_field(grid, [sx, 0, 50-zwater, 0, 0],
+                                           f).field for sx in srcx]
+                   for f in freqs])
+time_direct = timer.elapsed
+
+# Compute the source fields once for one frequency, and scale them to all
+# frequencies.
+timer = emg3d.utils.Time()
+sfields = [emg3d.get_source_field(grid, [sx, 0, 50-zwater, 0, 0], freq)
+           for sx in srcx]
+sources = np.array([sfield.field for sfield in sfields])
+scaled = np.array([scale_sources(sources, sfields[0], f) for f in freqs])
+time_scaled = timer.elapsed
+
+print(f"Direct computation : {time_direct:.3f} s")
+print(f"One frequency+scale: {time_scaled:.3f} s")
+print(f"Max. abs. difference: {np.max(abs(direct-scaled)):.2e}")
+
+###############################################################################
+# A source field for the solver is then, e.g., for the second source and the
+# third frequency:
+
+sfield = emg3d.Field(grid, scaled[2, 1], freq=freqs[2])
+
+
+###############################################################################
+# One grid per group of sources
+# -----------------------------
+#
+# A grid for all sources has to cover the whole survey. Grids which are
+# adapted to each source, on the other hand, require to interpolate the model
+# for each source, although the grids of neighbouring sources are almost
+# identical. In between is to group neighbouring sources, and to create one
+# grid per group. The model is then interpolated once per group, and shared
+# by all sources of the group.
+#
+# Here we group the sources such that the sources within a group are at most
+# ``max_span`` apart. Each group grid only covers its sources and the
+# receivers within ``max_offset`` of them, which are the data used, e.g., in
+# an inversion. The domain is padded by two skin depths of the background,
+# in addition to the boundary added by :func:`emg3d.meshes.get_hx_h0`.
+
+max_span = 1000    # Max. distance between sources within a group.
+max_offset = 4000  # Max. source-receiver offset of the used data.
+padding = 2*503.3*np.sqrt(1/freq)  # Two skin depths in background (1 Ohm.m).
+
+# Group the (sorted) sources.
+groups = [[srcx[0]]]
+for sx in srcx[1:]:
+    if sx - groups[-1][0] <= max_span:
+        groups[-1].append(sx)
+    else:
+        groups.append([sx])
+
+
+def get_group_grid(group):
+    """Return the grid for a group of sources and its receivers."""
+    rx = recx[(recx >= group[0]-max_offset) & (recx <= group[-1]+max_offset)]
+    domain = [min(group[0], rx[0])-padding, max(group[-1], rx[-1])+padding]
+    xx, x0 = emg3d.meshes.get_hx_h0(
+        res=[0.3, 1.], fixed=group[len(group)//2], domain=domain, **ginp)
+    return emg3d.TensorMesh([xx, yy, zz], x0=np.array([x0, y0, z0]))
+
+
+data_group = np.full((srcx.size, recx.size), np.nan+1j*np.nan)
+for group in groups:
+
+    # Grid and model, shared by all sources of this group.
+    group_grid = get_group_grid(group)
+    group_model = model.interpolate2grid(grid, group_grid)
+    print(f"Group {group}: {group_grid.nC:,d} cells "
+          f"(shared grid: {grid.nC:,d} cells)")
+
+    for sx in group:
+        sfield = emg3d.get_source_field(
+                group_grid, [sx, 0, 50-zwater, 0, 0], freq)
+        efield = emg3d.solve(group_grid, group_model, sfield, **solver_opts)
+
+        # Only the receivers within max_offset of this source.
+        used = abs(recx-sx) <= max_offset
+        data_group[srcx.tolist().index(sx), used] = emg3d.get_receiver(
+                group_grid, efield.fx, (recx[used], recx[used]*0, -zwater))
+
+rel_error = abs(data_loop-data_group)/abs(data_loop)
+print(f"Model interpolations: {len(groups)} instead of {srcx.size}")
+print(f"Max. rel. difference to the shared grid: "
+      f"{100*np.nanmax(rel_error):.1f} %")
+
+###############################################################################
+
+plt.figure()
+plt.title('Group grids vs shared grid')
+for i in [0, srcx.size//2, srcx.size-1]:
+    plt.plot((recx-srcx[i])/1e3, 100*rel_error[i, :], f"C{i%10}.-",
+             label=f"Source at x = {srcx[i]/1e3:.1f} km")
+plt.xlabel('Offset (km)')
+plt.ylabel('Rel. difference (%)')
+plt.legend()
+plt.show()
+
+
+###############################################################################
+
+emg3d.Report()
@@ -0,0 +1,125 @@
+"""
+7. Task payload of parallel workers
+===================================
+
+When tasks are computed in parallel processes, everything a task needs has to
+be sent to the worker. Here we measure how much data is sent, and how long it
+takes to pickle it, for three ways of providing a model to the tasks:
+
+1. The model is sent with every task;
+2. the model is sent once to each worker (through the initializer of the
+   executor), the tasks only contain their own parameters;
+3. the model is placed once in shared memory
+   (:mod:`multiprocessing.shared_memory`), and the workers attach to it by its
+   name; neither the workers nor the tasks receive a copy of the model.
+
+This is the situation of, e.g., the finite-difference gradient in
+:ref:`sphx_glr_gallery_comparisons_as_vs_fd_gradient.py`, where every task
+changes the model in one voxel.
+
+"""
+import emg3d
+import pickle
+import numpy as np
+from multiprocessing import shared_memory
+import matplotlib.pyplot as plt
+plt.style.use('ggplot')
+
+
+###############################################################################
+# Model and tasks
+# ---------------
+#
+# A model of 128 x 128 x 128 cells; each task is a voxel index.
+
+nx = 128
+hx = np.ones(nx)*50
+grid = emg3d.TensorMesh([hx, hx, hx], x0='CCC')
+model = emg3d.Model(grid, np.ones(grid.vnC), mapping='Conductivity')
+
+ntasks = 100
+tasks = [(i, nx//2, i % nx) for i in range(ntasks)]
+
+
+###############################################################################
+# Shared memory
+# -------------
+#
+# The conductivities are copied once into a shared memory block. What has to
+# be sent to the workers is only the name, shape, and dtype of the block.
+
+shm = shared_memory.SharedMemory(create=True, size=model.property_x.nbytes)
+shared = np.ndarray(model.property_x.shape, model.property_x.dtype,
+                    buffer=shm.buf)
+shared[:] = model.property_x[:]
+shared_info = (shm.name, shared.shape, shared.dtype.str)
+
+
+def attach(name, shape, dtype):
+    """Attach to the shared memory block ``name`` (done in the worker)."""
+    block = shared_memory.SharedMemory(name=name)
+    return block, np.ndarray(shape, dtype, buffer=block.buf)
+
+
+# The workers receive a view of the model, not a copy.
+block, values = attach(*shared_info)
+print(f"Shared values identical: {np.array_equal(values, model.property_x)}")
+del values
+block.close()
+
+
+###############################################################################
+# Payloads
+# --------
+
+def payload(*args):
+    """Return size (MB) and pickling time (s) of ``args``."""
+    timer = emg3d.utils.Time()
+    size = len(pickle.dumps(args, protocol=pickle.HIGHEST_PROTOCOL))
+    return size/1e6, timer.elapsed
+
+
+payloads = {}
+
+# 1. Grid and model with every task.
+sizes = [payload(grid, model, task) for task in tasks]
+payloads['per task'] = np.sum(sizes, axis=0)
+
+# 2. Grid and model once per worker, plus the tasks.
+nworkers = 4
+sizes = [payload(grid, model) for _ in range(nworkers)]
+sizes += [payload(task) for task in tasks]
+payloads['per worker'] = np.sum(sizes, axis=0)
+
+# 3. Grid and name of the shared memory once per worker, plus the tasks.
+sizes = [payload(grid, shared_info) for _ in range(nworkers)]
+sizes += [payload(task) for task in tasks]
+payloads['shared memory'] = np.sum(sizes, axis=0)
+
+# Free the shared memory.
+shm.close()
+shm.unlink()
+
+for key, (size, time) in payloads.items():
+    print(f"{key:>13}: {size:10.3f} MB; {time:7.3f} s")
+
+
+###############################################################################
+# Plot
+# ----
+
+fig, axs = plt.subplots(1, 2, figsize=(9, 3), sharey=True)
+axs[0].set_title(f"Sent data for {ntasks} tasks")
+axs[0].barh(list(payloads.keys()), [v[0] for v in payloads.values()])
+axs[0].set_xscale('log')
+axs[0].set_xlabel('MB')
+axs[1].set_title('Pickling time')
+axs[1].barh(list(payloads.keys()), [v[1] for v in payloads.values()])
+axs[1].set_xlabel('Time (s)')
+plt.tight_layout()
+plt.show()
+
+
+###############################################################################
+
+emg3d.Report()
@@ -0,0 +1,176 @@
+"""
+8. Profiling a solve
+====================
+
+The info returned by :func:`emg3d.solver.solve` with ``return_info=True``
+contains the overall runtime and the error and runtime at each cycle. It does
+not tell where within a cycle the time is spent: smoothing, residual,
+restriction, prolongation, or the Krylov solver.
+
+Here we record every call of the functions of :mod:`emg3d.solver` with a
+profile function (:func:`sys.setprofile`), together with the multigrid level
+at which it is called, and the size of the arrays it receives. The records
+are summarized per level and per function, and exported in the Chrome-trace
+format, which can be viewed in ``chrome://tracing`` or at
+https://ui.perfetto.dev.
+
+Note that the profile function adds some overhead to each recorded call, and
+that the array size of the input is only a rough measure of the memory
+traffic of a function.
+
+"""
+import emg3d
+import os
+import sys
+import json
+import time
+import numpy as np
+import matplotlib.pyplot as plt
+plt.style.use('ggplot')
+
+
+###############################################################################
+# Profiler
+# --------
+
+class SolverProfile:
+    """Record all calls of the functions of ``emg3d.solver``.
+
+    The level of a call is the number of ``multigrid`` calls it is nested in,
+    as ``multigrid`` calls itself for each coarser level; calls outside of
+    ``multigrid`` have level -1.
+
+    """
+
+    def __init__(self):
+        self.fname = os.path.join('emg3d', 'solver.py')
+        self.stack = []
+        self.records = []
+
+    def __call__(self, frame, event, arg):
+        if event not in ['call', 'return']:
+            return
+        if not frame.f_code.co_filename.endswith(self.fname):
+            return
+
+        now = time.perf_counter()
+        if event == 'call':
+            nbytes = sum(v.nbytes for v in frame.f_locals.values()
+                         if isinstance(v, np.ndarray))
+            self.stack.append((frame.f_code.co_name, now, nbytes))
+        else:
+            name, start, nbytes = self.stack.pop()
+            level = sum(n == 'multigrid' for n, _, _ in self.stack)
+            if name != 'multigrid':
+                level -= 1
+            self.records.append({'name': name, 'level': level,
+                                 'start': start, 'end': now,
+                                 'nbytes': nbytes})
+
+    def __enter__(self):
+        sys.setprofile(self)
+        return self
+
+    def __exit__(self, *args):
+        sys.setprofile(None)
+
+    def summary(self):
+        """Calls, total time (s), and input size (MB) per (level, name)."""
+        out = {}
+        for rec in self.records:
+            entry = out.setdefault((rec['level'], rec['name']), [0, 0., 0.])
+            entry[0] += 1
+            entry[1] += rec['end']-rec['start']
+            entry[2] += rec['nbytes']/1e6
+        return out
+
+    def to_chrome_trace(self, fname):
+        """Store the records as complete events in Chrome-trace format."""
+        t0 = min(rec['start'] for rec in self.records)
+        events = [{
+            'name': rec['name'],
+            'cat': f"level {rec['level']}",
+            'ph': 'X',
+            'ts': (rec['start']-t0)*1e6,
+            'dur': (rec['end']-rec['start'])*1e6,
+            'pid': 0,
+            'tid': 0,
+            'args': {'level': rec['level'], 'MB': rec['nbytes']/1e6},
+        } for rec in self.records]
+        with open(fname, 'w') as f:
+            json.dump({'traceEvents': events}, f)
+
+
+###############################################################################
+# Model
+# -----
+#
+# Homogeneous fullspace of 1 Ohm.m, 64 x 64 x 64 cells, x-directed source at
+# the origin, 1 Hz.
+
+nx = 64
+hx = np.ones(nx)*50
+x0 = -nx//2*50
+grid = emg3d.TensorMesh([hx, hx, hx], x0=(x0, x0, x0))
+model = emg3d.Model(grid, property_x=1., mapping='Resistivity')
+sfield = emg3d.get_source_field(grid, [0, 0, 0, 0, 0], freq=1.0)
+
+
+###############################################################################
+# Profile
+# -------
+#
+# We profile a solve with MG as preconditioner for BiCGSTAB, with
+# semicoarsening and line relaxation.
+
+with SolverProfile() as profile:
+    efield, info = emg3d.solve(
+            grid, model, sfield, sslsolver=True, semicoarsening=True,
+            linerelaxation=True, verb=1, return_info=True)
+
+summary = profile.summary()
+for (level, name), (ncalls, runtime, mbytes) in sorted(summary.items()):
+    print(f"Level {level:2d} :: {name:>13}: {ncalls:5d} calls; "
+          f"{runtime:7.3f} s; {mbytes:9.1f} MB")
+
+print(f"\nTotal runtime of the solve: {info['time']:.3f} s")
+
+###############################################################################
+# Chrome trace
+# ------------
+
+profile.to_chrome_trace('solve-trace.json')
+print(f"Recorded calls: {len(profile.records)}")
+
+
+###############################################################################
+# Plot
+# ----
+#
+# Time spent per level, split by function. The time of a function includes
+# the time of the functions it calls; ``multigrid`` and ``solve`` are
+# therefore not shown, as they contain all others.
+
+names = sorted({name for _, name in summary
+                if name not in ['multigrid', 'solve']})
+levels = sorted({level for level, _ in summary if level >= 0})
+
+plt.figure()
+bottom = np.zeros(len(levels))
+for name in names:
+    runtime = np.array([summary.get((lv, name), [0, 0., 0.])[1]
+                        for lv in levels])
+    plt.bar(levels, runtime, bottom=bottom, label=name)
+    bottom += runtime
+plt.xlabel('MG level (0 = finest)')
+plt.ylabel('Time (s)')
+plt.legend()
+plt.show()
+
+# Remove the trace file.
+os.remove('solve-trace.json')
+
+
+###############################################################################
+
+emg3d.Report()
@@ -0,0 +1,152 @@
+"""
+6. Receiver interpolation operator
+==================================
+
+:func:`emg3d.fields.get_receiver` interpolates one field component at the
+receiver locations; every call sets up the interpolation again. If many
+fields (several sources, frequencies, or components) are interpolated at the
+same receivers, the interpolation can instead be written once as a sparse
+matrix, which is then applied to all fields in one sparse matrix product.
+
+Here we build such an operator for linear interpolation, and compare it to
+:func:`emg3d.fields.get_receiver` with ``method='linear'``.
+
+"""
+import emg3d
+import itertools
+import numpy as np
+from scipy import sparse
+import matplotlib.pyplot as plt
+plt.style.use('ggplot')
+
+
+###############################################################################
+def receiver_operator(grid, comp, coordinates):
+    """Sparse matrix for linear interpolation of ``comp`` at ``coordinates``.
+
+    The returned matrix has shape ``(nrec, n)``, where ``n`` is the number of
+    edges of the component ``comp`` (``'fx'``, ``'fy'``, or ``'fz'``). It is
+    applied to the component flattened in Fortran order. Receivers outside of
+    the grid get the value of the closest edge.
+
+    """
+
+    # Locations of the edges of this component.
+    points = {
+        'fx': (grid.vectorCCx, grid.vectorNy, grid.vectorNz),
+        'fy': (grid.vectorNx, grid.vectorCCy, grid.vectorNz),
+        'fz': (grid.vectorNx, grid.vectorNy, grid.vectorCCz),
+    }[comp]
+    shape = [pts.size for pts in points]
+
+    # Receiver coordinates as flat arrays of the same size.
+    coords = [np.ravel(c) for c in np.broadcast_arrays(*coordinates)]
+    nrec = coords[0].size
+
+    # For each dimension: index of the left point, weight of the right point.
+    ind, wgt = [], []
+    for pts, crd in zip(points, coords):
+        i = np.clip(np.searchsorted(pts, crd)-1, 0, pts.size-2)
+        ind.append(i)
+        wgt.append(np.clip((crd-pts[i])/(pts[i+1]-pts[i]), 0, 1))
+
+    # Collect the eight corners of each receiver.
+    rows, cols, vals = [], [], []
+    for corner in itertools.product([0, 1], repeat=3):
+        w = np.ones(nrec)
+        for d in range(3):
+            w *= wgt[d] if corner[d] else 1-wgt[d]
+        ix, iy, iz = [ind[d]+corner[d] for d in range(3)]
+        rows.append(np.arange(nrec))
+        cols.append(ix + shape[0]*(iy + shape[1]*iz))
+        vals.append(w)
+
+    rows, cols = np.concatenate(rows), np.concatenate(cols)
+    return sparse.csr_matrix((np.concatenate(vals), (rows, cols)),
+                             shape=(nrec, np.prod(shape)))
+
+
+###############################################################################
+# Fields
+# ------
+#
+# Fullspace of 1 Ohm.m; x-directed sources at different positions.
+
+nx = 64
+hx = np.ones(nx)*50
+x0 = -nx//2*50
+grid = emg3d.TensorMesh([hx, hx, hx], x0=(x0, x0, x0))
+model = emg3d.Model(grid, property_x=1., mapping='Resistivity')
+
+freq = 1.0
+srcx = np.array([-500, -250, 0, 250, 500])
+efields = []
+for sx in srcx:
+    sfield = emg3d.get_source_field(grid, [sx, 0, 0, 0, 0], freq=freq)
+    efields.append(emg3d.solve(grid, model, sfield, verb=1))
+
+###############################################################################
+# Receivers
+# ---------
+#
+# A regular grid of 257 x 257 receivers at 100 m below the sources.
+
+x = np.linspace(-1200, 1200, 257)
+rx, ry = np.meshgrid(x, x, indexing='ij')
+rz = -100.
+coordinates = (rx, ry, rz)
+
+
+###############################################################################
+# Interpolation with get_receiver
+# -------------------------------
+
+timer = emg3d.utils.Time()
+resp_gr = np.array([emg3d.get_receiver(grid, efield.fx, coordinates,
+                                       method='linear').ravel()
+                    for efield in efields])
+time_gr = timer.elapsed
+
+
+###############################################################################
+# Interpolation with the operator
+# -------------------------------
+#
+# The operator is created once, and then applied to all fields at once.
+
+timer = emg3d.utils.Time()
+op_fx = receiver_operator(grid, 'fx', coordinates)
+time_setup = timer.elapsed
+
+timer = emg3d.utils.Time()
+resp_op = (op_fx @ np.column_stack(
+    [efield.fx.ravel('F') for efield in efields])).T
+time_op = timer.elapsed
+
+print(f"get_receiver       : {time_gr:6.3f} s")
+print(f"Operator (setup)   : {time_setup:6.3f} s")
+print(f"Operator (apply)   : {time_op:6.3f} s")
+print(f"Max. rel. difference: "
+      f"{np.max(abs(resp_op-resp_gr)/abs(resp_gr)):.2e}")
+
+
+###############################################################################
+# Plot
+# ----
+
+fig, axs = plt.subplots(1, 2, figsize=(9, 4), sharey=True)
+for i, (data, title) in enumerate(zip(
+        [resp_gr[2], resp_op[2]], ['get_receiver', 'Operator'])):
+    axs[i].set_title(title)
+    amp = np.log10(abs(data)).reshape(rx.shape).T
+    cf = axs[i].pcolormesh(x/1e3, x/1e3, amp, vmin=-12, vmax=-8)
+    axs[i].set_xlabel('x (km)')
+    axs[i].axis('equal')
+axs[0].set_ylabel('y (km)')
+fig.colorbar(cf, ax=axs, label=r'$\log_{10}|E_x|$ (V/m)')
+plt.show()
+
+
+###############################################################################
+
+emg3d.Report()
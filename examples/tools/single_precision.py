@@ -0,0 +1,112 @@
+"""
+4. Single vs double precision
+=============================
+
+The solver ``emg3d`` computes in double precision (``complex128``). The
+required memory of the fields could be halved by storing them in single
+precision (``complex64``). Here we check what we lose by doing so:
+
+- How much memory do we save?
+- How big is the error at the receivers?
+- Can we recover a double-precision solution from a single-precision field?
+
+The last point is done by using the single-precision field as starting field
+for another solve in double precision. The solver checks the residual of the
+starting field in double precision, and carries out multigrid cycles only if
+the field is not yet good enough.
+
+"""
+import emg3d
+import numpy as np
+import matplotlib.pyplot as plt
+plt.style.use('ggplot')
+
+
+###############################################################################
+# Model and survey
+# ----------------
+#
+# - Model size is nx * nx * nx, centered around the origin.
+# - Source is at the origin, x-directed.
+# - Frequency is 1 Hz.
+# - Homogenous space of 1 Ohm.m.
+# - Inline receivers from 500 m to 1500 m offset.
+
+nx = 64
+hx = np.ones(nx)*50
+x0 = -nx//2*50
+grid = emg3d.TensorMesh([hx, hx, hx], x0=(x0, x0, x0))
+
+src = [0, 0, 0, 0, 0]
+freq = 1.0
+off = np.arange(10, 31)*50
+rec = (off, off*0, 0)
+
+model = emg3d.Model(grid, property_x=1., mapping='Resistivity')
+sfield = emg3d.get_source_field(grid, src, freq=freq, strength=0)
+
+
+###############################################################################
+# Double precision
+# ----------------
+
+efield, info = emg3d.solve(grid, model, sfield, verb=1, return_info=True)
+resp64 = emg3d.get_receiver(grid, efield.fx, rec)
+
+
+###############################################################################
+# Single precision
+# ----------------
+#
+# Store the field in single precision, and compute the responses from it.
+
+field32 = efield.field.astype(np.complex64)
+efield32 = emg3d.Field(grid, field32.astype(complex), freq=freq)
+resp32 = emg3d.get_receiver(grid, efield32.fx, rec)
+
+print(f"Memory of the field in double precision: "
+      f"{efield.field.nbytes/1e6:6.1f} MB")
+print(f"Memory of the field in single precision: "
+      f"{field32.nbytes/1e6:6.1f} MB")
+
+
+###############################################################################
+# Restart in double precision
+# ---------------------------
+#
+# The single-precision field is used as starting field. The reported error is
+# the true residual in double precision.
+
+info32 = emg3d.solve(grid, model, sfield, efield=efield32, verb=1,
+                     return_info=True)
+
+print(f"Double precision   :: {info['it_mg']:2d} MG cycles; "
+      f"rel. error: {info['rel_error']:.2e}")
+print(f"Restart from single:: {info32['it_mg']:2d} MG cycles; "
+      f"rel. error: {info32['rel_error']:.2e}")
+
+
+###############################################################################
+# Plot
+# ----
+#
+# The relative error caused by single precision is of the order of the machine
+# precision of ``complex64`` (:math:`\approx 10^{-7}`), hence well below the
+# default tolerance of the solver (:math:`10^{-6}`).
+
+plt.figure()
+plt.title('Relative error of single-precision responses')
+plt.semilogy(off, abs((resp32.real-resp64.real)/resp64.real), 'o-',
+             label='Real')
+plt.semilogy(off, abs((resp32.imag-resp64.imag)/resp64.imag), 'o-',
+             label='Imaginary')
+plt.axhline(np.finfo(np.float32).eps, c='k', ls='--', label='Machine eps')
+plt.xlabel('Offset (m)')
+plt.ylabel('Rel. error (-)')
+plt.legend()
+plt.show()
+
+
+###############################################################################
+
+emg3d.Report()
@@ -0,0 +1,148 @@
+"""
+5. Storage formats
+==================
+
+Comparing the storage formats for computed fields: the formats of
+:func:`emg3d.io.save` and :func:`emg3d.io.load` (``npz``, ``h5``, ``json``),
+and a chunked, compressed HDF5 layout written directly with ``h5py``.
+
+The files of :func:`emg3d.io.save` are always read entirely. The chunked
+layout stores all frequencies of a field component in one dataset, chunked
+by frequency and by slabs in z-direction. A single frequency or a sub-volume
+can then be read without reading the rest of the file.
+
+The comparison of the formats is done for reading all fields; the partial
+reads of the chunked layout are listed separately, together with the amount
+of data they read.
+
+The compression filters used here (``gzip``, ``lzf``) come with ``h5py``.
+Other filters such as blosc, lz4, or zstd can be used in the same way after
+installing ``hdf5plugin``.
+
+"""
+import emg3d
+import os
+import h5py
+import numpy as np
+import matplotlib.pyplot as plt
+plt.style.use('ggplot')
+
+
+###############################################################################
+# Fields
+# ------
+#
+# We compute the fields of a homogeneous fullspace for a few frequencies.
+
+nx = 48
+hx = np.ones(nx)*50
+x0 = -nx//2*50
+grid = emg3d.TensorMesh([hx, hx, hx], x0=(x0, x0, x0))
+model = emg3d.Model(grid, property_x=1., mapping='Resistivity')
+
+freqs = np.array([0.1, 0.5, 1.0, 5.0])
+fields = {}
+for freq in freqs:
+    sfield = emg3d.get_source_field(grid, [0, 0, 0, 0, 0], freq=freq)
+    fields[f"f{freq}"] = emg3d.solve(grid, model, sfield, verb=1)
+
+
+###############################################################################
+# emg3d.save and emg3d.load
+# -------------------------
+
+def timeit(fct, *args, **kwargs):
+    """Return the runtime (s) of ``fct(*args, **kwargs)``."""
+    timer = emg3d.utils.Time()
+    fct(*args, **kwargs)
+    return timer.elapsed
+
+
+results = {}
+for ext in ['npz', 'h5', 'json']:
+    fname = f"storage-test.{ext}"
+    results[ext] = {
+        'save': timeit(emg3d.save, fname, grid=grid, verb=0, **fields),
+        'load': timeit(emg3d.load, fname, verb=0),
+        'size': os.path.getsize(fname)/1e6,
+    }
+    os.remove(fname)
+
+
+###############################################################################
+# Chunked HDF5
+# ------------
+#
+# Each field component is stored as one dataset of shape ``(nfreq, nx, ny,
+# nz)``, in chunks of one frequency and eight cells in z-direction.
+
+def save_chunked(fname, compression):
+    """Store all fields of all frequencies in a chunked HDF5 file."""
+    with h5py.File(fname, 'w') as h5:
+        h5.create_dataset('freqs', data=freqs)
+        for comp in ['fx', 'fy', 'fz']:
+            data = np.array([getattr(f, comp) for f in fields.values()])
+            h5.create_dataset(
+                    comp, data=data, compression=compression,
+                    chunks=(1, *data.shape[1:3], 8))
+
+
+def load_chunked(fname, comps=('fx', 'fy', 'fz'), ifreq=slice(None),
+                 iz=slice(None)):
+    """Load ``comps`` for frequency(ies) ``ifreq`` and z-slab(s) ``iz``."""
+    with h5py.File(fname, 'r') as h5:
+        return [h5[c][ifreq, :, :, iz] for c in comps]
+
+
+# Partial reads of the chunked layout.
+partial_reads = {
+    'all fields': {},
+    'fx, one frequency': {'comps': ['fx'], 'ifreq': 2},
+    'fx, one frequency, z-slab': {'comps': ['fx'], 'ifreq': 2,
+                                  'iz': slice(16, 24)},
+}
+
+partial = {}
+for compression in ['gzip', 'lzf']:
+    fname = 'storage-test-chunked.h5'
+    results[f"h5py-{compression}"] = {
+        'save': timeit(save_chunked, fname, compression),
+        'load': timeit(load_chunked, fname),
+        'size': os.path.getsize(fname)/1e6,
+    }
+    for key, kwargs in partial_reads.items():
+        nbytes = sum(a.nbytes for a in load_chunked(fname, **kwargs))
+        partial[f"h5py-{compression}: {key}"] = (
+            timeit(load_chunked, fname, **kwargs), nbytes/1e6)
+    os.remove(fname)
+
+
+###############################################################################
+# Results
+# -------
+
+# Data read by a full load: all fields (the grid is negligible).
+full = sum(f.nbytes for f in fields.values())/1e6
+print(f"Full load, all formats: {full:.3f} MB of field data\n")
+
+for key, value in results.items():
+    print(f"{key:>13}: " + "; ".join(
+          [f"{k}: {v:.3f} {'MB' if k == 'size' else 's'}"
+           for k, v in value.items()]))
+
+print("\nPartial reads of the chunked layout:")
+for key, (time, size) in partial.items():
+    print(f"{key:>37}: {time:.3f} s; {size:.3f} MB read")
+
+fig, axs = plt.subplots(1, 3, figsize=(9, 4), sharey=True)
+for i, what in enumerate(['save', 'load', 'size']):
+    axs[i].set_title('load (all fields)' if what == 'load' else what)
+    axs[i].barh(list(results.keys()), [v[what] for v in results.values()])
+    axs[i].set_xlabel('MB' if what == 'size' else 'Time (s)')
+plt.tight_layout()
+plt.show()
+
+
+###############################################################################
+
+emg3d.Report(h5py)
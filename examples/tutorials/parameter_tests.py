@@ -13,9 +13,15 @@ applicable to other models. What is faster depends on your input. Influence has
 particularly the degree of anisotropy and of grid stretching. These are simply
 examples that you can adjust for your problem at hand.
 
+Several of the tests below share settings (e.g., the default F-cycle is part
+of the first and the second test). The solves are therefore cached by their
+settings, so each distinct setting is computed only once. For this to work,
+settings which are left at their default are not passed.
+
 """
 import emg3d
 import numpy as np
+from functools import lru_cache
 import matplotlib.pyplot as plt
 from matplotlib.colors import LogNorm
 plt.style.use('ggplot')
@@ -42,6 +48,20 @@ def plotit(infos, labels):
     plt.show()
 
 
+###############################################################################
+@lru_cache(maxsize=64)
+def _cached_solve(settings):
+    """Solve for given settings; only the info is kept, not the field."""
+    _, info = emg3d.solve(grid, model_iso, sfield, return_info=True,
+                          **{'verb': 1, **dict(settings)})
+    return info
+
+
+def solve(**kwargs):
+    """Return the info of a solve, computing it only if not done before."""
+    return _cached_solve(tuple(sorted(kwargs.items())))
+
+
 ###############################################################################
 
 # Survey
@@ -88,12 +108,9 @@ grid.plot_3d_slicer(model_iso.property_x.ravel('F'),
 # Test 1: F, W, and V MG cycles
 # -----------------------------
 
-inp = {'grid': grid, 'model': model_iso, 'sfield': sfield,
-       'verb': 1, 'return_info': True}
-
-_, info1 = emg3d.solve(cycle='F', **inp)
-_, info2 = emg3d.solve(cycle='W', **inp)
-_, info3 = emg3d.solve(cycle='V', **inp)
+info1 = solve()  # Default: F-cycle.
+info2 = solve(cycle='W')
+info3 = solve(cycle='V')
 
 plotit([info1, info2, info3], ['F-cycle', 'W-cycle', 'V-cycle'])
 
@@ -101,13 +118,10 @@ plotit([info1, info2, info3], ['F-cycle', 'W-cycle', 'V-cycle'])
 # Test 2: semicoarsening, line-relaxation
 # ---------------------------------------
 
-inp = {'grid': grid, 'model': model_iso, 'sfield': sfield,
-       'verb': 1, 'return_info': True}
-
-_, info1 = emg3d.solve(**inp)
-_, info2 = emg3d.solve(semicoarsening=True, **inp)
-_, info3 = emg3d.solve(linerelaxation=True, **inp)
-_, info4 = emg3d.solve(semicoarsening=True, linerelaxation=True, **inp)
+info1 = solve()
+info2 = solve(semicoarsening=True)
+info3 = solve(linerelaxation=True)
+info4 = solve(semicoarsening=True, linerelaxation=True)
 
 plotit([info1, info2, info3, info4], ['MG', 'MG+SC', 'MG+LR', 'MG+SC+LR'])
 
@@ -115,12 +129,11 @@ plotit([info1, info2, info3, info4], ['MG', 'MG+SC', 'MG+LR', 'MG+SC+LR'])
 # Test 3: MG and BiCGstab
 # -----------------------
 
-inp = {'grid': grid, 'model': model_iso, 'sfield': sfield,
-       'semicoarsening': True, 'verb': 1, 'return_info': True, 'maxit': 500}
+inp = {'semicoarsening': True, 'maxit': 500}
 
-_, info1 = emg3d.solve(cycle='F', sslsolver=False, **inp)
-_, info2 = emg3d.solve(cycle='F', sslsolver=True, **inp)
-_, info3 = emg3d.solve(cycle=None, sslsolver=True, **inp)
+info1 = solve(**inp)
+info2 = solve(sslsolver=True, **inp)
+info3 = solve(cycle=None, sslsolver=True, **inp)
 
 plotit([info1, info2, info3], ['MG', 'MG+BiCGStab', 'BiCGStab'])
 
@@ -128,17 +141,96 @@ plotit([info1, info2, info3], ['MG', 'MG+BiCGStab', 'BiCGStab'])
 # Test 4: `nu_init`, `nu_pre`, `nu_coarse`, `nu_post`
 # ---------------------------------------------------
 
-inp = {'grid': grid, 'model': model_iso, 'sfield': sfield,
-       'semicoarsening': True, 'verb': 1, 'return_info': True}
+inp = {'semicoarsening': True}
 
-_, info1 = emg3d.solve(**inp)
-_, info2 = emg3d.solve(nu_pre=0, **inp)
-_, info3 = emg3d.solve(nu_post=0, **inp)
-_, info4 = emg3d.solve(nu_init=2, **inp)
+info1 = solve(**inp)
+info2 = solve(nu_pre=0, **inp)
+info3 = solve(nu_post=0, **inp)
+info4 = solve(nu_init=2, **inp)
 
 plotit([info1, info2, info3, info4],
        ['{0,2,1,2} (default)', '{0,0,1,2}', '{0,2,1,0}', '{2,1,2,1}'])
 
+###############################################################################
+# Test 5: Krylov solvers
+# ----------------------
+#
+# Instead of BiCGSTAB, the other Krylov subspace solvers of
+# :mod:`scipy.sparse.linalg` accepted by ``emg3d`` as ``sslsolver`` can be
+# used, with or without MG as preconditioner: CGS and GCROT(m,k). (GMRES and
+# LGMRES are not accepted by ``emg3d`` and raise an error.) What counts is the
+# time to reach the tolerance, not the number of iterations, as the cost of an
+# iteration differs between the solvers.
+
+inp = {'cycle': 'F', 'semicoarsening': True, 'maxit': 500}
+krylov = ['bicgstab', 'cgs', 'gcrotmk']
+
+infos = [solve(sslsolver=name, **inp) for name in krylov]
+
+plotit(infos, [f"MG+{name}" for name in krylov])
+
+for name, info in zip(krylov, infos):
+    print(f"MG+{name:8}: {info['runtime_at_cycle'][-1]:6.2f} s; "
+          f"exit: {info['exit']}")
+
+###############################################################################
+# Automatic selection
+# -------------------
+#
+# The tests above can be automated, picking the setting with the shortest
+# time to tolerance. To keep the cost of the test low, each candidate is only
+# run for five MG cycles. The time to tolerance is then extrapolated from the
+# error reduction per second of the last cycle, as recorded in
+# ``info['error_at_cycle']`` and ``info['runtime_at_cycle']``. (The first
+# cycles reduce the error much more than the later ones, and are therefore not
+# used for the extrapolation.) Candidates which do not reduce the error are
+# never selected. Only the selected setting is solved to the end. The trials
+# are run with ``verb=-1``, as each of them would otherwise warn that the
+# maximum number of iterations was reached, which is expected here.
+
+
+def time_to_tolerance(info, tol=1e-6):
+    """Estimate the time (s) to reach ``tol`` from the recorded cycles."""
+    error = info['error_at_cycle']/info['ref_error']
+    runtime = info['runtime_at_cycle']
+    if error[-1] <= tol:  # Already converged.
+        return runtime[-1]
+    rate = np.log(error[-1]/error[-2])/(runtime[-1]-runtime[-2])
+    if not rate < 0:  # Stagnating or diverging.
+        return np.inf
+    return runtime[-1] + np.log(tol/error[-1])/rate
+
+
+candidates = [
+    {'cycle': cycle, 'semicoarsening': sc, 'linerelaxation': lr}
+    for cycle in ['F', 'W', 'V']
+    for sc in [False, True]
+    for lr in [False, True]
+]
+
+estimates = [time_to_tolerance(solve(maxit=5, verb=-1, **c))
+             for c in candidates]
+best = candidates[np.argmin(estimates)]
+
+for c, estimate in zip(candidates, estimates):
+    print(f"{c}: {estimate:6.2f} s")
+
+# Solve the selected setting anew (not from the cache) to measure its runtime.
+_, info = emg3d.solve(grid, model_iso, sfield, verb=1, return_info=True,
+                      **best)
+print(f"Selected: {best}")
+print(f"Estimated: {min(estimates):.2f} s; "
+      f"actual: {info['runtime_at_cycle'][-1]:.2f} s")
+
+###############################################################################
+# Cache statistics
+# ----------------
+#
+# Hits are solves which were not carried out again, as the same settings were
+# already computed in a previous test.
+
+print(_cached_solve.cache_info())
+
 ###############################################################################
 
 emg3d.Report()
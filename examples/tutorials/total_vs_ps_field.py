@@ -6,19 +6,20 @@ We usually use ``emg3d`` for total field computations. However, we can also use
 it in a primary-secondary field formulation, where we compute the primary
 field with a (semi-)analytical solution.
 
-In this example we use ``emg3d`` to compute
+In this example we compute
 
-- Total field
-- Primary field
-- Secondary field
+- Total field (``emg3d``)
+- Primary field (1D background, ``empymod``)
+- Secondary field (``emg3d``)
 
 and compare the total field to the primary+secondary field.
 
-The primary-field computation could be replaced by a 1D modeller such as
-``empymod``. You can play around with the required computation-domain: Using a
-primary-secondary formulation makes it possible to restrict the required
-computation domain for the scatterer a lot, therefore speeding up the
-computation. However, we do not dive into that in this example.
+The primary field is only required where the conductivity differs from the
+background, and at the receivers. It is therefore computed with the 1D
+modeller ``empymod`` only at these locations, instead of a 3D computation for
+the entire grid. Using a primary-secondary formulation makes it also possible
+to restrict the required computation domain for the scatterer a lot, therefore
+speeding up the computation. This is done at the end of this example.
 
 Background
 ----------
@@ -72,6 +73,7 @@ and the secondary field can be computed using the primary field as source,
 
 """
 import emg3d
+import empymod
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.colors import LogNorm
@@ -88,6 +90,10 @@ rec = [off, off*0, -1000]   # In-line receivers on the seafloor
 res = [1e10, 0.3, 1]        # 1D resistivities (Ohm.m): [air, water, backgr.]
 freq = 1.0                  # Frequency (Hz)
 
+# 1D background for empymod: interfaces, and resistivities from the bottom.
+depth = [-1000, 0]
+res_1d = res[::-1]
+
 ###############################################################################
 # Mesh
 # ----
@@ -153,16 +159,6 @@ sfield_tf = emg3d.get_source_field(grid, src, freq, strength=0)
 em3_tf = emg3d.solve(grid, model, sfield_tf, **modparams)
 
 
-###############################################################################
-# Compute primary field (1D background) with ``emg3d``
-# ----------------------------------------------------
-#
-# Here we use ``emg3d`` to compute the primary field. This could be replaced
-# by a (semi-)analytical solution.
-
-sfield_pf = emg3d.get_source_field(grid, src, freq, strength=0)
-em3_pf = emg3d.solve(grid, model_pf, sfield_pf, **modparams)
-
 ###############################################################################
 # Compute secondary field (scatterer) with ``emg3d``
 # --------------------------------------------------
@@ -170,27 +166,89 @@ em3_pf = emg3d.solve(grid, model_pf, sfield_pf, **modparams)
 # Define the secondary source
 # ```````````````````````````
 
-# Get the difference of conductivity as volume-average values
-diff = 1/model.property_x-1/model_pf.property_x
-dsigma = grid.vol.reshape(grid.vnC, order='F')*diff
+# The secondary source is zero wherever :math:`\Delta\sigma` is zero. The
+# primary field (1D background) is therefore only computed with ``empymod`` on
+# the edges with :math:`\Delta\sigma \ne 0`. ``empymod.dipole`` takes one
+# receiver depth per call, so there is one call per depth of these edges.
+
+
+def primary_field(ab, coords, ind):
+    """Primary field of component ``ab`` on the edges where ``ind`` is True."""
+    field = np.zeros(ind.shape, dtype=complex)
+    x, y, _ = np.meshgrid(*coords, indexing='ij')
+    for iz in np.unique(np.nonzero(ind)[2]):
+        i = ind[:, :, iz]
+        rec = [x[:, :, iz][i], y[:, :, iz][i], coords[2][iz]]
+        field[:, :, iz][i] = empymod.dipole(
+                src[:3], rec, depth, res_1d, freq, ab=ab, verb=1)
+    return field
+
+
+def edge_dsigma(grid, model, model_pf):
+    """Return delta sigma averaged to the x-, y-, and z-edges."""
+
+    # Get the difference of conductivity as volume-average values
+    diff = 1/model.property_x-1/model_pf.property_x
+    dsigma = grid.vol.reshape(grid.vnC, order='F')*diff
+
+    # Average delta sigma to the corresponding edges
+    dsx = np.zeros(grid.vnEx)
+    dsy = np.zeros(grid.vnEy)
+    dsz = np.zeros(grid.vnEz)
+    dsx[:, 1:-1, 1:-1] = 0.25*(dsigma[:, :-1, :-1] + dsigma[:, 1:, :-1] +
+                               dsigma[:, :-1, 1:] + dsigma[:, 1:, 1:])
+    dsy[1:-1, :, 1:-1] = 0.25*(dsigma[:-1, :, :-1] + dsigma[1:, :, :-1] +
+                               dsigma[:-1, :, 1:] + dsigma[1:, :, 1:])
+    dsz[1:-1, 1:-1, :] = 0.25*(dsigma[:-1, :-1, :] + dsigma[1:, :-1, :] +
+                               dsigma[:-1, 1:, :] + dsigma[1:, 1:, :])
+
+    return dsx, dsy, dsz
+
+
+def secondary_source(grid, model, model_pf):
+    """Return the secondary source field for ``model`` on ``grid``."""
 
-# Here we use the primary field computed with emg3d. This could be done
-# with a 1D modeller such as empymod instead.
-fx = em3_pf.fx.copy()
-fy = em3_pf.fy.copy()
-fz = em3_pf.fz.copy()
+    # Delta sigma on the edges.
+    dsx, dsy, dsz = edge_dsigma(grid, model, model_pf)
 
-# Average delta sigma to the corresponding edges
-fx[:, 1:-1, 1:-1] *= 0.25*(dsigma[:, :-1, :-1] + dsigma[:, 1:, :-1] +
-                           dsigma[:, :-1, 1:] + dsigma[:, 1:, 1:])
-fy[1:-1, :, 1:-1] *= 0.25*(dsigma[:-1, :, :-1] + dsigma[1:, :, :-1] +
-                           dsigma[:-1, :, 1:] + dsigma[1:, :, 1:])
-fz[1:-1, 1:-1, :] *= 0.25*(dsigma[:-1, :-1, :] + dsigma[1:, :-1, :] +
-                           dsigma[:-1, 1:, :] + dsigma[1:, 1:, :])
+    # Multiply by the primary field
+    fx = dsx*primary_field(
+            11, (grid.vectorCCx, grid.vectorNy, grid.vectorNz), dsx != 0)
+    fy = dsy*primary_field(
+            21, (grid.vectorNx, grid.vectorCCy, grid.vectorNz), dsy != 0)
+    fz = dsz*primary_field(
+            31, (grid.vectorNx, grid.vectorNy, grid.vectorCCz), dsz != 0)
 
-# Create field instance iwu dsigma E
-sfield_sf = sfield_pf.smu0*emg3d.Field(fx, fy, fz, freq=freq)
-sfield_sf.ensure_pec
+    nedges = sum(np.count_nonzero(ds) for ds in [dsx, dsy, dsz])
+    print(f"Primary field computed on {nedges:,d} of {grid.nE:,d} edges.")
+
+    # Create field instance iwu dsigma E
+    sfield = emg3d.Field(grid, freq=freq)
+    sfield = sfield.smu0*emg3d.Field(fx, fy, fz, freq=freq)
+    sfield.ensure_pec
+    return sfield
+
+
+sfield_sf = secondary_source(grid, model, model_pf)
+
+###############################################################################
+# As a check we compute the :math:`x`-component of the primary field on all
+# edges of the grid at the top, centre, and bottom depth of the scatterer, and
+# compare it on the edges of the scatterer to the sampled primary field used in
+# the secondary source. Three depths are enough for the check, and avoid
+# calling ``empymod`` for every depth of the grid.
+
+coords_x = (grid.vectorCCx, grid.vectorNy, grid.vectorNz)
+dsx = edge_dsigma(grid, model, model_pf)[0]
+iz = np.unique(np.nonzero(dsx)[2])
+check = np.zeros(grid.vnEx, dtype=bool)
+check[:, :, iz[[0, iz.size//2, -1]]] = True
+full_px = primary_field(11, coords_x, check)
+support = (dsx != 0) & check
+smu0 = emg3d.Field(grid, freq=freq).smu0
+sampled_px = sfield_sf.fx[support]/(smu0*dsx[support])
+print(f"Max. rel. difference sampled vs full-grid primary field: "
+      f"{np.max(abs(sampled_px-full_px[support])/abs(full_px[support])):.2e}")
 
 ###############################################################################
 # Plot the secondary source
@@ -214,28 +272,31 @@ grid.plot_3d_slicer(
 # Compute the secondary source
 # ````````````````````````````
 
+timer = emg3d.utils.Time()
 em3_sf = emg3d.solve(grid, model, sfield_sf, **modparams)
+time_sf = timer.elapsed
 
 ###############################################################################
 # Plot result
 # -----------
 
-# E = E^p + E^s
-em3_ps = em3_pf + em3_sf
-
 # Get the responses at receiver locations
 rectuple = (rec[0], rec[1], rec[2])
-em3_pf_rec = emg3d.get_receiver(grid, em3_pf.fx, rectuple)
 em3_tf_rec = emg3d.get_receiver(grid, em3_tf.fx, rectuple)
 em3_sf_rec = emg3d.get_receiver(grid, em3_sf.fx, rectuple)
-em3_ps_rec = emg3d.get_receiver(grid, em3_ps.fx, rectuple)
+
+# Primary field at receiver locations
+epm_pf_rec = empymod.dipole(src[:3], rec, depth, res_1d, freq, verb=1)
+
+# E = E^p + E^s
+em3_ps_rec = epm_pf_rec + em3_sf_rec
 
 ###############################################################################
 plt.figure(figsize=(9, 5))
 
 ax1 = plt.subplot(121)
 plt.title('|Real part|')
-plt.plot(off/1e3, abs(em3_pf_rec.real), 'k',
+plt.plot(off/1e3, abs(epm_pf_rec.real), 'k',
          label='Primary Field (1D Background)')
 plt.plot(off/1e3, abs(em3_sf_rec.real), '.4', ls='--',
          label='Secondary Field (Scatterer)')
@@ -249,7 +310,7 @@ plt.legend()
 
 ax2 = plt.subplot(122, sharey=ax1)
 plt.title('|Imaginary part|')
-plt.plot(off/1e3, abs(em3_pf_rec.imag), 'k')
+plt.plot(off/1e3, abs(epm_pf_rec.imag), 'k')
 plt.plot(off/1e3, abs(em3_sf_rec.imag), '.4', ls='--')
 plt.plot(off/1e3, abs(em3_ps_rec.imag), label='P/S Field')
 plt.plot(off[::2]/1e3, abs(em3_tf_rec[::2].imag), '.', label='Total Field')
@@ -265,6 +326,90 @@ plt.legend()
 plt.tight_layout()
 plt.show()
 
+
+###############################################################################
+# Restrict the computation domain
+# -------------------------------
+#
+# The grid above has to contain the source and a large boundary because of
+# the air layer. The secondary field, however, is only excited where
+# :math:`\Delta\sigma \ne 0`, and it is only required at the receivers. We
+# therefore create a second grid which only covers the anomaly and the
+# receivers. This domain is padded by one skin depth of the background (of the
+# water above the seafloor), and :func:`emg3d.meshes.get_hx_h0` adds the
+# boundary in terms of skin depths of the background; in the vertical
+# direction of the subsurface below and of the water above.
+
+# Anomaly support: the cells where model and background differ.
+anomaly = model.property_x != model_pf.property_x
+ix, iy, iz = [np.nonzero(anomaly.any(axis=axes))[0]
+              for axes in [(1, 2), (0, 2), (0, 1)]]
+
+
+def domain_with_padding(nodes, ind, rec, pad):
+    """Domain covering the cells ``ind`` of ``nodes`` and receivers ``rec``.
+
+    The domain is extended by ``pad = [below, above]``.
+
+    """
+    return [min(nodes[ind[0]], np.min(rec))-pad[0],
+            max(nodes[ind[-1]+1], np.max(rec))+pad[1]]
+
+
+# Skin depths in the background and in the water.
+skin = 503.3*np.sqrt(res[2]/freq)
+skin_water = 503.3*np.sqrt(res[1]/freq)
+
+xdomain = domain_with_padding(grid.vectorNx, ix, rec[0], [skin, skin])
+ydomain = domain_with_padding(grid.vectorNy, iy, rec[1], [skin, skin])
+zdomain = domain_with_padding(grid.vectorNz, iz, rec[2], [skin, skin_water])
+
+# Fixed boundaries in z: top of the target (center), seafloor (above), and
+# bottom of the target (below).
+xx, x0 = emg3d.meshes.get_hx_h0(
+    res=[res[2], res[2]], domain=xdomain, fixed=rec[0][0], **meshinp)
+yy, y0 = emg3d.meshes.get_hx_h0(
+    res=[res[2], res[2]], domain=ydomain, fixed=0, **meshinp)
+zz, z0 = emg3d.meshes.get_hx_h0(
+    res=[res[2], res[2], res[1]], domain=zdomain,
+    fixed=[-2000, rec[2], -2500], **meshinp)
+
+sgrid = emg3d.TensorMesh([xx, yy, zz], x0=np.array([x0, y0, z0]))
+sgrid
+
+###############################################################################
+# The models are interpolated to the new grid, and the secondary source is
+# computed directly on it.
+
+smodel = model.interpolate2grid(grid, sgrid)
+smodel_pf = model_pf.interpolate2grid(grid, sgrid)
+ssfield_sf = secondary_source(sgrid, smodel, smodel_pf)
+
+timer = emg3d.utils.Time()
+sem3_sf = emg3d.solve(sgrid, smodel, ssfield_sf, **modparams)
+time_ssf = timer.elapsed
+
+sem3_sf_rec = emg3d.get_receiver(sgrid, sem3_sf.fx, rectuple)
+sem3_ps_rec = epm_pf_rec + sem3_sf_rec
+
+print(f"Cells  : {grid.nC:10,d} -> {sgrid.nC:10,d} "
+      f"({100*sgrid.nC/grid.nC:.0f} %)")
+print(f"Runtime: {time_sf:10.2f} -> {time_ssf:10.2f} s "
+      f"({100*time_ssf/time_sf:.0f} %)")
+
+###############################################################################
+
+plt.figure()
+plt.title('Relative error of the P/S field w.r.t. the total field')
+plt.plot(off/1e3, abs((em3_ps_rec-em3_tf_rec)/em3_tf_rec), label='Full grid')
+plt.plot(off/1e3, abs((sem3_ps_rec-em3_tf_rec)/em3_tf_rec),
+         label='Restricted grid')
+plt.xlabel('Offset (km)')
+plt.ylabel('Rel. error (-)')
+plt.yscale('log')
+plt.legend()
+plt.show()
+
 ###############################################################################
 
 emg3d.Report()